@@ -1,31 +1,29 @@
 from __future__ import annotations
-from typing import Dict, Any, List
+import asyncio
+import logging
+from collections import OrderedDict
 
-def headers_to_dict(hlist: List[Dict[str, Any]] | None) -> Dict[str, Any]:
-    d: Dict[str, Any] = {}
-    for item in (hlist or []):
-        d.update(item)
-    return d
+from wire import headers_to_dict, node_of
 
-def dict_to_headers(d: Dict[str, Any]) -> List[Dict[str, Any]]:
-    return [{k: v} for k, v in d.items()]
-
-def node_of(address: str) -> str:
-    # "sec30.<group>.nodo3" -> "N3"
-    try:
-        last = address.split(".")[-1]  # "nodo3"
-        num = int(last.replace("nodo", ""))
-        return f"N{num}"
-    except Exception:
-        # Si ya viene "N3", devolverlo tal cual
-        return address
+log = logging.getLogger("flooding")
 
 class FloodingStrategy:
+    # Tope del LRU de dedup: memoria constante en corridas largas
+    SEEN_CAP = 65536
+
+    def __init__(self) -> None:
+        # OrderedDict como LRU: el hit mueve al final, el overflow expulsa
+        # el más viejo. Un set crecería sin límite con cada message_id.
+        self.seen: OrderedDict[str, None] = OrderedDict()
+
     async def handle_message(self, router, msg: dict) -> None:
         mid = msg.get("message_id")
-        if mid in router.seen_ids:
+        if mid in self.seen:
+            self.seen.move_to_end(mid)
             return
-        router.seen_ids.add(mid)
+        self.seen[mid] = None
+        if len(self.seen) > self.SEEN_CAP:
+            self.seen.popitem(last=False)
 
         dst_addr = msg.get("to", "")
         dst_node = node_of(dst_addr)
@@ -45,27 +43,32 @@ class FloodingStrategy:
             path.append(router.me)
 
         # Vecinos del nodo actual
-        neighbors = list(router.graph[router.me].keys())
-        # Evitar devolver al que lo mandó
-        fanout = [nb for nb in neighbors if nb != last_via]
+        my_edges = router.graph[router.me]
+        # Evitar devolver al que lo mandó y a cualquiera que ya esté en el
+        # path: esos ya vieron el mensaje y su dedup lo descartaría igual,
+        # así que el publish sería puro desperdicio
+        path_set = set(path)
+        fanout = [nb for nb in my_edges if nb != last_via and nb not in path_set]
 
-        # Propagar a cada vecino
-        for nb in fanout:
-            fwd = dict(msg)
-            fwd["ttl"] = msg.get("ttl", 0) - 1
-            if fwd["ttl"] <= 0:
-                continue
+        ttl = msg.get("ttl", 0) - 1
+        if ttl <= 0 or not fanout:
+            return
 
-            hh = dict(h)
-            cost = hh.get("cost", 0)
-            try:
-                cost += router.graph[router.me][nb]
-            except Exception:
-                pass
-            hh.update({"via": router.me, "path": path, "cost": cost})
-            fwd["headers"] = dict_to_headers(hh)
+        # Lo compartido entre todos los vecinos se arma una sola vez; por
+        # vecino solo cambia el cost, así que cada fwd es un merge barato.
+        base_cost = h.get("cost", 0)
+        base_headers = {**h, "via": router.me, "path": path}
 
-            await router.publish(nb, fwd)
+        # Propagar a cada vecino (publishes concurrentes: la latencia del
+        # fanout pasa de suma de RTTs a max de RTTs)
+        to_send = []
+        for nb in fanout:
+            # headers dict plano en el wire (ver wire.headers_to_dict)
+            fwd = {**msg, "ttl": ttl,
+                   "headers": {**base_headers, "cost": base_cost + my_edges.get(nb, 0)}}
+            to_send.append((nb, fwd))
 
-        if fanout:
-            print(f"[{router.me}] FLOOD → {fanout} (dest {dst_node}) path={path} seen={len(router.seen_ids)}")
\ No newline at end of file
+        await asyncio.gather(*(router.publish(nb, m) for nb, m in to_send))
+        # por-mensaje va a DEBUG; la llegada a destino (arriba) sigue en print
+        log.debug("[%s] FLOOD → %s (dest %s) path=%s seen=%d",
+                  router.me, fanout, dst_node, path, len(self.seen))
\ No newline at end of file
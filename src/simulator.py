@@ -1,8 +1,12 @@
 # node_link_state.py
-import os, json, asyncio, time, argparse, socket, re
+import os, json, asyncio, time, argparse, socket, heapq, logging
+from functools import lru_cache
 from typing import Dict, Any
+import orjson
 import redis.asyncio as redis
 from dotenv import load_dotenv
+from dijkstra import dijkstra_bidi, build_csr, dijkstra_csr
+from wire import address_of, node_of
 load_dotenv()
 
 # ------------- Helpers de direcciones -----------------
@@ -14,27 +18,16 @@ def group_for_node(node: str, my_group: str) -> str:
         my_group='grupo3', node='N2' -> 'grupo2'
     """
     n = int(node[1:])
-    base = re.sub(r'\d+$', '', my_group or '')
+    # rstrip de dígitos finales: igual que re.sub(r'\d+$', '') pero sin
+    # pasar por el motor de regex en cada publish
+    base = (my_group or '').rstrip('0123456789')
     return f"{base}{n}"
 
-def address_of(node: str, group: str) -> str:
-    # "N3" -> "sec30.<group>.nodo3"
-    n = int(node[1:])
-    return f"sec30.{group}.nodo{n}"
-
+@lru_cache(maxsize=1024)
 def address_for_dest(node: str, my_group: str) -> str:
     """Atajo para direccionar al canal del DESTINO (group por nodo)."""
     return address_of(node, group_for_node(node, my_group))
 
-def node_of(addr: str) -> str:
-    # "sec30.<group>.nodo3" -> "N3"
-    try:
-        last = addr.split(".")[-1]  # "nodo3"
-        num = int(last.replace("nodo", ""))
-        return f"N{num}"
-    except Exception:
-        return addr  # ya viene "N3"
-
 def parse_neighbors(s: str | None) -> Dict[str, int]:
     # "N2:10,N5:14,N8:15" -> {"N2":10,"N5":14,"N8":15}
     if not s:
@@ -67,47 +60,19 @@ def make_hello(from_addr: str, to_addr: str, weight: int) -> dict:
         "hops": int(weight),
     }
 
-# ------------- Dijkstra minimal -----------------------
-
-def dijkstra(graph: Dict[str, Dict[str, int]], src: str):
-    dist = {u: float("inf") for u in graph.keys()}
-    prev: Dict[str, str] = {}
-    dist[src] = 0
-    visited = set()
-    while True:
-        u = None
-        best = float("inf")
-        for k, d in dist.items():
-            if k not in visited and d < best:
-                best, u = d, k
-        if u is None:
-            break
-        visited.add(u)
-        for v, w in graph.get(u, {}).items():
-            nd = dist[u] + w
-            if nd < dist.get(v, float("inf")):
-                dist[v] = nd
-                prev[v] = u
-    return dist, prev
-
-def build_next_hop(src: str, prev: Dict[str, str]) -> Dict[str, str]:
-    nh: Dict[str, str] = {}
-    for dst in prev.keys():
-        cur = dst
-        while prev.get(cur) and prev[cur] != src:
-            cur = prev[cur]
-        if prev.get(cur) == src:
-            nh[dst] = cur
-    return nh
-
 # ------------- Nodo Link-State ------------------------
 
 class Node:
+    # Tope de comandos encolados antes de forzar un flush del pipeline
+    # (regla "flush cada 20-50 comandos"; el resto sale al tick del loop)
+    FLUSH_N = 50
+
     def __init__(self, me: str, group: str, neighbors: Dict[str, int],
                  redis_host: str, redis_port: int, redis_pwd: str,
                  hello_period: int = 3, hello_misses: int = 10,
                  remote_age: int = 60, stable_nochange: int = 100,
-                 debug: bool = False):
+                 debug: bool = False,
+                 redis_client: "redis.Redis | None" = None):
         self.me = me
         self.group = group
         self.addr_me = address_of(me, group)
@@ -118,86 +83,275 @@ class Node:
         self.STABLE_NOCHANGE = int(stable_nochange)
 
         self.debug = debug
+        # Logger por nodo: el tráfico por-mensaje va a DEBUG (lazy, %-style)
+        # para que el hot path no pague stdio ni formateo sin --debug
+        self.log = logging.getLogger(self.me)
+        self.log.setLevel(logging.DEBUG if debug else logging.INFO)
+        # Contador para _stats_tick
+        self._forwarded = 0
+        # Payload crudo del mensaje entrante en proceso: el forward lo
+        # re-publica tal cual, sin re-encodear (el contenido no cambia)
+        self._inbound_raw: str | bytes | None = None
 
         # Tabla de topología:
-        # topo[u][v] = {"weight": w, "time": int} (si u==me o v==me)  ó  {"weight": w, "age": int} (remoto)
+        # topo[u][v] = {"weight": w, "hello_deadline": t} (si u==me)
+        #           ó  {"weight": w, "expire_at": t} (remoto)
+        # Los deadlines son time.monotonic() absolutos.
         self.topo: Dict[str, Dict[str, Dict[str, Any]]] = {}
         # Contador de mensajes "message" que NO cambian nada
         self.nochange_count = 0
 
-        # Conexión Redis
-        self.r = redis.Redis(host=redis_host, port=redis_port, password=redis_pwd, decode_responses=True)
+        # Cache del grafo para Dijkstra: se invalida por versión de topología.
+        # Cada mutación real (arista agregada/eliminada o peso cambiado) hace
+        # self._topo_version += 1; los refrescos de timers no la tocan.
+        self._topo_version = 0
+        self._graph_cache: Dict[str, Dict[str, int]] | None = None
+        self._graph_cache_version = -1
+        self._live_cache: list[str] | None = None
+        self._live_cache_ver = -1
+        # Pares (vecino, canal) de vecinos vivos para los fanouts;
+        # misma invalidación por versión
+        self._live_chans: list[tuple[str, str]] | None = None
+        self._live_chans_ver = -1
+        # Vista CSR del grafo (índices enteros) + arreglos scratch para el
+        # Dijkstra de _run_and_print_dijkstra; misma invalidación por versión
+        self._csr_cache: tuple | None = None
+        self._csr_cache_version = -1
+        self._dist_scratch: list[float] = []
+        self._prev_scratch: list[int] = []
+        # Versión de topología del último SPF corrido: si no cambió, los
+        # scratch ya contienen el resultado y la corrida se omite
+        self._spf_version = -1
+        # Tabla next-hop derivada del SPF: dst -> (next_hop, costo).
+        # Misma invalidación por versión; ver route_to()
+        self._route_cache: Dict[str, tuple[str, int]] | None = None
+        self._route_cache_version = -1
+
+        # Heap de deadlines: (deadline, kind, a, b) con kind "hello"
+        # (muerte de vecino directo; a=vecino) o "remote" (vencimiento de
+        # adyacencia remota a-b). Lazy deletion: si el deadline guardado en
+        # meta ya no coincide con la entrada, la entrada está obsoleta y se
+        # descarta al poparla.
+        self._expiry_heap: list[tuple[float, str, str, str]] = []
+
+        # Buffer de publishes salientes; ver _enqueue/_flush
+        self._out_buf: list[tuple[str, bytes | str]] = []
+        self._flush_scheduled = False
+
+        # Anti-floods redundantes: hash del último estado floodeado y
+        # debounce para colapsar ráfagas de triggers en un solo flood
+        self._last_flood_hash: int | None = None
+        self._flood_scheduled = False
+        self._flood_debounce = 0.05  # segundos
+
+        # Hellos pre-serializados por vecino: el dict y su JSON son
+        # idénticos tick a tick mientras el peso no cambie.
+        # nbr -> (weight, channel, payload_bytes)
+        self._hello_cache: Dict[str, tuple[int, str, bytes]] = {}
+
+        # Canal de salida por nodo destino (address_for_dest es pura;
+        # un dict por instancia es más barato que el lru_cache global)
+        self._chan_cache: Dict[str, str] = {
+            nbr: address_for_dest(nbr, self.group) for nbr in self.neighbors_cfg
+        }
+
+        # Conexión Redis: se puede inyectar un cliente compartido (varios
+        # nodos en un mismo proceso comparten pool y socket de publish;
+        # cada pubsub() igual toma su conexión dedicada del pool)
+        if redis_client is not None:
+            self.r = redis_client
+        else:
+            self.r = redis.Redis(host=redis_host, port=redis_port, password=redis_pwd,
+                                 decode_responses=True)
         self.listen_channel = self.addr_me
 
-        # Inicializar adyacencias directas (con timer "time")
+        # Inicializar adyacencias directas (con deadline de hellos)
         self._ensure_node(self.me)
         for nbr, w in self.neighbors_cfg.items():
             self._ensure_node(nbr)
-            self.topo[self.me][nbr] = {"weight": w, "time": self.HELLO_MISSES}
+            deadline = time.monotonic() + self.HELLO_MISSES * self.HELLO_PERIOD
+            self.topo[self.me][nbr] = {"weight": w, "hello_deadline": deadline}
+            heapq.heappush(self._expiry_heap, (deadline, "hello", nbr, ""))
             self.topo.setdefault(nbr, {}).setdefault(self.me, {"weight": w})
-            # No ponemos "time" del lado remoto (solo del lado me->vecino)
+            # No ponemos deadline del lado remoto (solo del lado me->vecino)
 
     # -------- utilidades de tabla --------
 
     def _ensure_node(self, u: str):
         self.topo.setdefault(u, {})
 
+    def _chan_for(self, node: str) -> str:
+        ch = self._chan_cache.get(node)
+        if ch is None:
+            ch = address_for_dest(node, self.group)
+            self._chan_cache[node] = ch
+        return ch
+
     def _get_graph_for_dijkstra(self) -> Dict[str, Dict[str, int]]:
         # Convierte topo en grafo simplificado u->v:weight (solo entradas vigentes)
+        if self._graph_cache_version == self._topo_version and self._graph_cache is not None:
+            return self._graph_cache
         g: Dict[str, Dict[str, int]] = {}
         for u, nbrs in self.topo.items():
             for v, meta in nbrs.items():
                 w = meta.get("weight")
                 if w is None:
                     continue
-                # Si es vecino directo mio, requiere que su "time" > 0 del lado me->vecino
+                # Si es vecino directo mio, requiere que su deadline de
+                # hellos siga vigente del lado me->vecino
                 if u == self.me and v in self.topo[self.me]:
-                    t = self.topo[self.me][v].get("time", 0)
-                    if t <= 0:
+                    hd = self.topo[self.me][v].get("hello_deadline")
+                    if hd is not None and hd <= time.monotonic():
+                        continue
+                # Si es remoto, requiere que no haya vencido su deadline.
+                # Las aristas adyacentes a mí no vencen por edad (igual que
+                # en _deadline_tick): su vida la gobiernan los hellos,
+                # aunque un flood ajeno les haya estampado expire_at.
+                if u != self.me and v != self.me:
+                    exp = meta.get("expire_at")
+                    if exp is not None and exp <= time.monotonic():
                         continue
-                # Si es remoto, requiere "age" > 0 si existe
-                age = meta.get("age", self.REMOTE_AGE)
-                if age <= 0:
-                    continue
                 g.setdefault(u, {})[v] = int(w)
+        self._graph_cache = g
+        self._graph_cache_version = self._topo_version
         return g
 
+    def _get_csr_for_dijkstra(self):
+        # Vista CSR (nodes, node_index, offsets, heads, weights) del grafo
+        # vigente, cacheada con la misma versión que el grafo
+        if self._csr_cache_version == self._topo_version and self._csr_cache is not None:
+            return self._csr_cache
+        g = self._get_graph_for_dijkstra()
+        node_index, offsets, heads, weights = build_csr(g)
+        nodes = list(node_index)
+        self._csr_cache = (nodes, node_index, offsets, heads, weights)
+        self._csr_cache_version = self._topo_version
+        if len(self._dist_scratch) != len(nodes):
+            self._dist_scratch = [0.0] * len(nodes)
+            self._prev_scratch = [0] * len(nodes)
+        return self._csr_cache
+
     def _live_neighbors(self):
-        # Vecinos directos cuyo time>0
+        # Vecinos directos cuyo time>0. Se cachea por versión de topología:
+        # la liveness solo cambia cruzando time=0, y todos esos cruces
+        # bumpean _topo_version.
+        if self._live_cache_ver == self._topo_version and self._live_cache is not None:
+            return self._live_cache
+        now = time.monotonic()
         out = []
         for v, meta in self.topo.get(self.me, {}).items():
-            if meta.get("time", 0) > 0:
+            if meta.get("hello_deadline", now) >= now:
                 out.append(v)
+        self._live_cache = out
+        self._live_cache_ver = self._topo_version
         return out
 
+    def _live_channels(self) -> list[tuple[str, str]]:
+        # [(vecino, canal)] vivos: el fanout itera esto sin resolver el
+        # canal por destino en cada publish
+        if self._live_chans_ver == self._topo_version and self._live_chans is not None:
+            return self._live_chans
+        self._live_chans = [(n, self._chan_for(n)) for n in self._live_neighbors()]
+        self._live_chans_ver = self._topo_version
+        return self._live_chans
+
     # -------- envío --------
 
     async def _publish(self, channel: str, msg: dict):
-        if self.debug:
-            print(f"[{self.me}] PUBLISH {channel} → {json.dumps(msg, ensure_ascii=False)}")
-        await self.r.publish(channel, json.dumps(msg))
+        # Encola y agenda un flush en el próximo tick del event loop: todos
+        # los publishes disparados en un mismo turno (p.ej. el fanout de un
+        # mensaje entrante) salen juntos en un solo pipeline.
+        self._enqueue(channel, msg)
+        if len(self._out_buf) >= self.FLUSH_N:
+            await self._flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_cb)
+
+    def _flush_cb(self):
+        self._flush_scheduled = False
+        if self._out_buf:
+            task = asyncio.ensure_future(self._flush())
+            task.add_done_callback(self._report_flush_error)
+
+    def _report_flush_error(self, task: "asyncio.Task"):
+        # El flush agendado no tiene awaiter; sin esto una caída de Redis
+        # se perdería como "Task exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            self.log.warning("[%s] flush de publishes falló: %s", self.me, task.exception())
+
+    def _enqueue(self, channel: str, msg: dict):
+        # Encola sin tocar la red; _flush() manda todo en un solo pipeline.
+        self._enqueue_raw(channel, orjson.dumps(msg))
+
+    def _enqueue_raw(self, channel: str, payload: bytes | str):
+        # Variante para payloads ya serializados: un mismo bytes se reusa
+        # para todos los canales del fanout sin re-encodear por destino
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("[%s] PUBLISH %s → %s", self.me, channel,
+                           payload.decode() if isinstance(payload, bytes) else payload)
+        self._out_buf.append((channel, payload))
+
+    async def _flush(self):
+        # Un solo round-trip a Redis para todo lo encolado
+        if not self._out_buf:
+            return
+        buf, self._out_buf = self._out_buf, []
+        pipe = self.r.pipeline(transaction=False)
+        for channel, payload in buf:
+            pipe.publish(channel, payload)
+        await pipe.execute()
 
     async def _flood_my_adjacencies(self):
+        # Debounce: ráfagas de triggers (varios hellos/muertes seguidos)
+        # colapsan en un solo flood un instante después
+        if self._flood_scheduled:
+            return
+        self._flood_scheduled = True
+        asyncio.get_running_loop().call_later(
+            self._flood_debounce,
+            lambda: asyncio.ensure_future(self._do_flood_my_adjacencies()))
+
+    async def _do_flood_my_adjacencies(self):
+        self._flood_scheduled = False
+        pairs = self._live_channels()
+        # Si el estado vivo es idéntico al último floodeado, no hay nada
+        # nuevo que contarle a nadie
+        state = tuple(sorted((v, self.topo[self.me][v]["weight"]) for v, _ in pairs))
+        h = hash(state)
+        if h == self._last_flood_hash:
+            return
+        self._last_flood_hash = h
         # Propaga TODAS mis adyacencias directas vivas a todos mis vecinos vivos
-        live = self._live_neighbors()
-        for nbr, meta in self.topo.get(self.me, {}).items():
-            if meta.get("time", 0) <= 0:
-                continue
-            w = meta["weight"]
+        for nbr, chan in pairs:
+            w = self.topo[self.me][nbr]["weight"]
             # >>> cambio: el 'to' y el canal de salida usan el group del DESTINO
-            msg = make_message(self.addr_me, address_for_dest(nbr, self.group), w)
-            for out in live:
-                await self._publish(address_for_dest(out, self.group), msg)
+            msg = make_message(self.addr_me, chan, w)
+            payload = orjson.dumps(msg)  # un solo encode para todos los outs
+            for _, out_chan in pairs:
+                self._enqueue_raw(out_chan, payload)
+            if len(self._out_buf) >= self.FLUSH_N:
+                await self._flush()
+        await self._flush()
 
     async def _send_hellos(self):
-        # Hello periódico a cada vecino directo (solo a ese vecino)
-        for nbr, meta in self.topo.get(self.me, {}).items():
-            if meta.get("time", 0) <= 0:
-                continue
+        # Hello periódico a cada vecino directo vivo (solo a ese vecino)
+        for nbr in self._live_neighbors():
+            meta = self.topo[self.me][nbr]
             w = meta["weight"]
-            # >>> cambio: hello hacia el canal del DESTINO
-            h = make_hello(self.addr_me, address_for_dest(nbr, self.group), w)
-            await self._publish(address_for_dest(nbr, self.group), h)
+            cached = self._hello_cache.get(nbr)
+            if cached is None or cached[0] != w:
+                # >>> cambio: hello hacia el canal del DESTINO
+                channel = self._chan_for(nbr)
+                h = make_hello(self.addr_me, channel, w)
+                cached = (w, channel, orjson.dumps(h))
+                self._hello_cache[nbr] = cached
+            self._enqueue_raw(cached[1], cached[2])
+        await self._flush()
 
     async def _forward_message_if_changed(self, msg: dict, changed: bool):
         if not changed:
@@ -208,10 +362,18 @@ class Node:
             return
         self.nochange_count = 0
         live = self._live_neighbors()
-        if self.debug:
-            print(f"[{self.me}] FORWARD {msg.get('from')} -> {msg.get('to')} a vecinos {live}")
-        for out in live:
-            await self._publish(address_for_dest(out, self.group), msg)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("[%s] FORWARD %s -> %s a vecinos %s",
+                           self.me, msg.get("from"), msg.get("to"), live)
+        self._forwarded += 1
+        if live:
+            # el forward no modifica el mensaje: se re-publica el payload
+            # crudo que llegó del wire (cero re-encode); mismo bytes a
+            # todos los vecinos en un pipeline
+            payload = self._inbound_raw if self._inbound_raw is not None else orjson.dumps(msg)
+            for _, out_chan in self._live_channels():
+                self._enqueue_raw(out_chan, payload)
+            await self._flush()
 
 
     # -------- recepción --------
@@ -225,20 +387,30 @@ class Node:
         if to != self.me:
             return
 
+        now = time.monotonic()
+        deadline = now + self.HELLO_MISSES * self.HELLO_PERIOD
+
         # Si no es vecino configurado, ignoro (o podría registrarlo)
         if frm not in self.topo.get(self.me, {}):
-            self.topo.setdefault(self.me, {})[frm] = {"weight": w, "time": self.HELLO_MISSES}
+            self.topo.setdefault(self.me, {})[frm] = {"weight": w, "hello_deadline": deadline}
+            heapq.heappush(self._expiry_heap, (deadline, "hello", frm, ""))
             self.topo.setdefault(frm, {})[self.me] = {"weight": w}
+            self._topo_version += 1
             await self._flood_my_adjacencies()
             return
 
-        # Actualiza peso si cambió y resetea timer
+        # Actualiza peso si cambió y resetea deadline
         meta = self.topo[self.me][frm]
         changed = False
         if meta.get("weight") != w:
             meta["weight"] = w
             changed = True
-        meta["time"] = self.HELLO_MISSES
+        if meta.get("hello_deadline", 0) <= now:
+            changed = True  # vecino dado por muerto que revive
+        meta["hello_deadline"] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, "hello", frm, ""))
+        if changed:
+            self._topo_version += 1
 
         # Mantener lado inverso con mismo peso
         self.topo.setdefault(frm, {}).setdefault(self.me, {})["weight"] = w
@@ -266,30 +438,40 @@ class Node:
         self._ensure_node(u)
         self._ensure_node(v)
 
-        # Guardar (u->v) y (v->u) con weight y age (remoto)
+        # Guardar (u->v) y (v->u) con weight y deadline de vencimiento (remoto)
+        deadline = time.monotonic() + self.REMOTE_AGE
         changed = False
         # u -> v
         cur = self.topo[u].get(v, {})
         if cur.get("weight") != w:
-            self.topo[u][v] = {"weight": w, "age": self.REMOTE_AGE}
+            self.topo[u][v] = {"weight": w, "expire_at": deadline}
             changed = True
         else:
-            # mismo peso → refrescar age
-            cur["age"] = self.REMOTE_AGE
+            # mismo peso → refrescar deadline
+            cur["expire_at"] = deadline
             self.topo[u][v] = cur
+        heapq.heappush(self._expiry_heap, (deadline, "remote", u, v))
 
         # v -> u
         cur2 = self.topo[v].get(u, {})
         if cur2.get("weight") != w:
-            self.topo[v][u] = {"weight": w, "age": self.REMOTE_AGE}
+            self.topo[v][u] = {"weight": w, "expire_at": deadline}
             changed = True
         else:
-            cur2["age"] = self.REMOTE_AGE
+            cur2["expire_at"] = deadline
             self.topo[v][u] = cur2
+        heapq.heappush(self._expiry_heap, (deadline, "remote", v, u))
+
+        if changed:
+            self._topo_version += 1
 
         # Reenviar SOLO si hubo cambio
         await self._forward_message_if_changed(msg, changed)
 
+    # Despacho por tipo: un dict lookup en vez de la cadena de if/elif
+    # (tipos desconocidos simplemente no despachan)
+    _HANDLERS = {"hello": handle_hello, "message": handle_message}
+
     # -------- tareas periódicas --------
 
     async def _hello_tick(self):
@@ -297,115 +479,220 @@ class Node:
             await self._send_hellos()
             await asyncio.sleep(self.HELLO_PERIOD)
 
-    async def _neighbor_timer_tick(self):
-        # Cada periodo HELLO, decrementa el contador de vecinos directos
+    async def _deadline_tick(self):
+        # Scheduler único por deadlines: muertes de vecinos directos
+        # (hellos perdidos) y vencimientos de adyacencias remotas. Duerme
+        # hasta el próximo deadline con tope HELLO_PERIOD, porque mientras
+        # duerme pueden entrar deadlines más tempranos que el tope actual
+        # (los budgets de hello son mucho más cortos que REMOTE_AGE).
         while True:
-            await asyncio.sleep(self.HELLO_PERIOD)
-            dead = []
-            for nbr, meta in list(self.topo.get(self.me, {}).items()):
-                t = meta.get("time", 0)
-                if t > 0:
-                    meta["time"] = t - 1
-                if meta["time"] <= 0:
-                    dead.append(nbr)
-            if dead:
-                for nbr in dead:
+            now = time.monotonic()
+            if not self._expiry_heap:
+                await asyncio.sleep(self.HELLO_PERIOD)
+                continue
+            top = self._expiry_heap[0][0]
+            if top > now:
+                await asyncio.sleep(min(top - now, self.HELLO_PERIOD))
+                continue
+            dead_nbrs = []
+            dead_remote = []
+            while self._expiry_heap and self._expiry_heap[0][0] <= time.monotonic():
+                dl, kind, a, b = heapq.heappop(self._expiry_heap)
+                if kind == "hello":
+                    meta = self.topo.get(self.me, {}).get(a)
+                    if meta is None or meta.get("hello_deadline") != dl:
+                        continue  # entrada obsoleta: hubo hello más reciente
+                    dead_nbrs.append(a)
+                else:  # "remote"
+                    if a == self.me or b == self.me:
+                        continue  # mis vecinos directos no vencen por edad
+                    meta = self.topo.get(a, {}).get(b)
+                    if meta is None or meta.get("expire_at") != dl:
+                        continue  # entrada obsoleta: ya refrescada o borrada
+                    dead_remote.append((a, b))
+            if dead_remote:
+                for (u, v) in dead_remote:
+                    print(f"[{self.me}] Expiró adyacencia remota {u}-{v}")
+                    self.topo[u].pop(v, None)
+                self._topo_version += 1
+                # No hace falta floodear "borrados" remotos según instrucción;
+                # cada nodo envejece de forma independiente.
+            if dead_nbrs:
+                for nbr in dead_nbrs:
                     print(f"[{self.me}] Vecino {nbr} cayó (sin hellos). Removiendo adyacencia.")
                     # Eliminar adyacencia en ambos sentidos
                     self.topo[self.me].pop(nbr, None)
                     self.topo.get(nbr, {}).pop(self.me, None)
+                self._topo_version += 1
                 # Floodear mis adyacencias vigentes
                 await self._flood_my_adjacencies()
                 # Recalcular ruta (opcional)
                 await self._run_and_print_dijkstra()
 
-    async def _remote_aging_tick(self):
-        # Baja 1s el age de adyacencias remotas
+    async def _stats_tick(self):
+        # Acumula contadores del hot path y los emite 1 vez por segundo,
+        # en vez de una línea por mensaje
         while True:
             await asyncio.sleep(1)
-            to_del = []
-            for u, nbrs in self.topo.items():
-                for v, meta in list(nbrs.items()):
-                    if u == self.me or v == self.me:
-                        continue  # mis vecinos directos no usan 'age'
-                    if "age" in meta:
-                        meta["age"] -= 1
-                        if meta["age"] <= 0:
-                            to_del.append((u, v))
-            if to_del:
-                for (u, v) in to_del:
-                    print(f"[{self.me}] Expiró adyacencia remota {u}-{v}")
-                    self.topo[u].pop(v, None)
-                # No hace falta floodear "borrados" remotos según instrucción;
-                # cada nodo envejece de forma independiente.
-
-    async def _run_and_print_dijkstra(self):
+            if self._forwarded and self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("[%s] stats: forwarded/s=%d topo_version=%d",
+                               self.me, self._forwarded, self._topo_version)
+            self._forwarded = 0
+
+    def _next_hop_table(self) -> Dict[str, tuple[str, int]]:
+        # dst -> (next_hop, costo) según el SPF vigente, cacheada por
+        # versión: reenviar es un dict.get sin tocar el grafo
+        if self._route_cache_version == self._topo_version and self._route_cache is not None:
+            return self._route_cache
+        table: Dict[str, tuple[str, int]] = {}
+        g = self._get_graph_for_dijkstra()
+        if self.me in g:
+            nodes, node_index, offsets, heads, weights = self._get_csr_for_dijkstra()
+            src = node_index[self.me]
+            dist, prev = self._dist_scratch, self._prev_scratch
+            if self._spf_version != self._topo_version:
+                dijkstra_csr(offsets, heads, weights, src, dist, prev)
+                self._spf_version = self._topo_version
+            for i, name in enumerate(nodes):
+                if i == src or prev[i] == -1:
+                    continue
+                cur = i
+                while prev[cur] != src:
+                    cur = prev[cur]
+                table[name] = (nodes[cur], dist[i])
+        self._route_cache = table
+        self._route_cache_version = self._topo_version
+        return table
+
+    def route_to(self, dst: str) -> tuple[str | None, float]:
+        """Next-hop y costo hacia `dst` según el último SPF; (None, inf)
+        si no hay ruta. Pensado para el camino de reenvío: un solo lookup."""
+        nh = self._next_hop_table().get(dst)
+        return nh if nh is not None else (None, float("inf"))
+
+    async def _run_and_print_dijkstra(self, dest: str | None = None):
         g = self._get_graph_for_dijkstra()
         if self.me not in g:
             print(f"\n[{self.me}] Grafo aún no tiene vecinos vivos; no se corre Dijkstra.\n")
             return
-        dist, prev = dijkstra(g, self.me)
-        nh = build_next_hop(self.me, prev)
+        if dest is not None:
+            if self._spf_version == self._topo_version:
+                # SPF vigente: la ruta ya está pagada, un lookup alcanza
+                nx, cost = self.route_to(dest)
+                print(f"\n[{self.me}] Ruta (cache SPF) {self.me} -> {dest}: "
+                      f"costo={cost}, nextHop={nx}\n")
+                return
+            # Recomputo dirigido a un solo destino: bidireccional visita
+            # ~la mitad de nodos que la corrida completa
+            cost, path = dijkstra_bidi(g, self.me, dest)
+            nx = path[1] if len(path) > 1 else None
+            print(f"\n[{self.me}] Ruta (Dijkstra bidi) {self.me} -> {dest}: "
+                  f"costo={cost}, nextHop={nx}, path={path}\n")
+            return
+        # Dijkstra sobre la vista CSR: el relax trabaja con índices enteros
+        # y arreglos planos; los nombres se traducen solo al imprimir
+        nodes, node_index, offsets, heads, weights = self._get_csr_for_dijkstra()
+        src = node_index[self.me]
+        dist, prev = self._dist_scratch, self._prev_scratch
+        if self._spf_version != self._topo_version:
+            # Los LSP duplicados bajo flooding disparan recomputos sin que
+            # el grafo haya cambiado; con la misma versión el SPF anterior
+            # sigue siendo válido
+            dijkstra_csr(offsets, heads, weights, src, dist, prev)
+            self._spf_version = self._topo_version
 
         print(f"\n[{self.me}] Tabla de ruteo (Dijkstra) sobre topología actual:")
-        for dst in sorted(g.keys()):
-            if dst == self.me:
+        for dst_i, dst in sorted(enumerate(nodes), key=lambda p: p[1]):
+            if dst_i == src:
                 continue
-            d = dist.get(dst, float("inf"))
-            nx = nh.get(dst)
-            # reconstruir path
-            path = []
-            cur = dst
+            d = dist[dst_i]
+            # reconstruir path por índices
+            path_idx = []
+            cur = dst_i
             guard = 0
-            while cur in prev and cur != self.me and guard < 10000:
-                path.append(cur)
+            while cur != -1 and cur != src and guard < 10000:
+                path_idx.append(cur)
                 cur = prev[cur]
                 guard += 1
-            if cur == self.me:
-                path.append(self.me)
-            path = list(reversed(path))
+            if cur == src:
+                path_idx.append(src)
+                path = [nodes[i] for i in reversed(path_idx)]
+                nx = path[1] if len(path) > 1 else None
+            else:
+                path, nx = [], None
             print(f"  {self.me} -> {dst}: costo={d}, nextHop={nx}, path={path}")
         print()
 
     # -------- loop principal --------
 
+    async def _startup(self):
+        # Flood inicial + tareas periódicas (compartido entre run() y el
+        # supervisor multi-nodo run_nodes_shared)
+        await self._flood_my_adjacencies()
+        asyncio.create_task(self._hello_tick())
+        asyncio.create_task(self._deadline_tick())
+        asyncio.create_task(self._stats_tick())
+
+    async def handle_raw(self, data: str | bytes):
+        # Decodifica y despacha un payload recibido del canal propio
+        try:
+            # orjson acepta str o bytes directamente
+            msg = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return  # payload ajeno/corrupto; cualquier otra excepción es un bug real
+
+        if not isinstance(msg, dict):
+            return  # JSON válido pero no es un mensaje (p.ej. un número suelto)
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            try:
+                self.log.debug("[%s] INBOUND %s ← %s", self.me, self.listen_channel,
+                               json.dumps(msg, ensure_ascii=False))
+            except (TypeError, ValueError):
+                self.log.debug("[%s] INBOUND %s ← <no-json-printable>",
+                               self.me, self.listen_channel)
+
+        handler = self._HANDLERS.get(msg.get("type"))
+        if handler is not None:
+            self._inbound_raw = data
+            await handler(self, msg)
+            self._inbound_raw = None
+
     async def run(self):
         async with self.r.pubsub() as ps:
             await ps.subscribe(self.listen_channel)
             print(f"{self.me} listening on {self.listen_channel}")
 
-            # Al iniciar, floodeo mis adyacencias
-            await self._flood_my_adjacencies()
+            await self._startup()
 
-            # Lanzar tareas periódicas
-            asyncio.create_task(self._hello_tick())
-            asyncio.create_task(self._neighbor_timer_tick())
-            asyncio.create_task(self._remote_aging_tick())
-
-            while True:
-                m = await ps.get_message(ignore_subscribe_messages=True, timeout=None)
-                if not m:
-                    continue
-                try:
-                    data = m["data"]
-                    msg = json.loads(data if isinstance(data, str) else data.decode())
-                except Exception:
-                    continue
+            # listen() entrega cada mensaje apenas llega (modelo push);
+            # get_message(timeout=None) tiene latencia conocida en redis-py
+            async for m in ps.listen():
+                if m.get("type") != "message":
+                    continue  # confirmaciones de subscribe y similares
+                await self.handle_raw(m["data"])
 
-                if self.debug:
-                    try:
-                        print(f"[{self.me}] INBOUND {self.listen_channel} ← {json.dumps(msg, ensure_ascii=False)}")
-                    except Exception:
-                        print(f"[{self.me}] INBOUND {self.listen_channel} ← <no-json-printable>")
-
-                mtype = msg.get("type")
-                if mtype == "hello":
-                    await self.handle_hello(msg)
-                elif mtype == "message":
-                    await self.handle_message(msg)
-                else:
-                    # ignorar otros tipos
-                    pass
+async def run_nodes_shared(nodes: "list[Node]", pattern: str = "sec30.*"):
+    """
+    Corre varios nodos en un mismo proceso con UNA sola suscripción:
+    psubscribe al patrón de canales y un único loop de recepción que
+    despacha cada mensaje al nodo dueño del canal. N suscripciones y N
+    loops de get_message se vuelven 1 y 1 (los nodos deben compartir el
+    cliente Redis; ver el parámetro redis_client de Node).
+    """
+    by_channel = {n.listen_channel: n for n in nodes}
+    r = nodes[0].r
+    async with r.pubsub() as ps:
+        await ps.psubscribe(pattern)
+        for n in nodes:
+            print(f"{n.me} listening on {n.listen_channel} (compartido: {pattern})")
+            await n._startup()
+        async for m in ps.listen():
+            if m.get("type") != "pmessage":
+                continue
+            node = by_channel.get(m["channel"])
+            if node is not None:
+                await node.handle_raw(m["data"])
 
 # ------------- Preflight Redis ------------------------
 
@@ -415,13 +702,18 @@ async def preflight_redis(host: str, port: int, pwd: str):
     except socket.gaierror as e:
         raise SystemExit(f"[preflight] DNS no pudo resolver {host}:{port} → {e}")
 
+    test = redis.Redis(host=host, port=port, password=pwd, socket_connect_timeout=30)
     try:
-        test = redis.Redis(host=host, port=port, password=pwd, socket_connect_timeout=30)
         pong = await test.ping()
         if pong is not True:
             raise SystemExit("[preflight] Redis respondió algo distinto a PONG")
+    except SystemExit:
+        raise
     except Exception as e:
         raise SystemExit(f"[preflight] No se pudo conectar a Redis {host}:{port} → {e}")
+    finally:
+        # No dejar colgada la conexión de prueba
+        await test.aclose()
 
 # ------------- Main -----------------------------------
 
@@ -440,6 +732,9 @@ async def main():
     p.add_argument("--debug", action="store_true")
     args = p.parse_args()
 
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format="%(message)s")
+
     await preflight_redis(args.redis_host, args.redis_port, args.redis_pwd)
 
     node = Node(
@@ -455,7 +750,17 @@ async def main():
         stable_nochange=args.stable_nochange,
         debug=args.debug,
     )
-    await node.run()
+    try:
+        await node.run()
+    finally:
+        await node.r.aclose()
 
 if __name__ == "__main__":
+    try:
+        # Opcional (no disponible en Windows): event loop en C que
+        # coalescea los writes del socket
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -1,19 +1,21 @@
-import re
 from collections import defaultdict
 from typing import Dict
 
-EDGE_RE = re.compile(r"N(\d+)-N(\d+):(\d+)")
-
 def parse_topology(text: str) -> Dict[str, Dict[str, int]]:
     """
     Devuelve un grafo no dirigido con pesos:
       g["N3"]["N9"] = 2
+
+    Parseo por tokens (split) en vez de regex sobre el archivo completo:
+    sin copia del texto ni motor de regex. Tokens malformados (p.ej. una
+    arista partida en dos líneas) se ignoran, igual que antes.
     """
     g = defaultdict(dict)
-    for n1, n2, w in EDGE_RE.findall(text.replace("\n", " ")):
-        a, b, w = f"N{n1}", f"N{n2}", int(w)
-        g[a][b] = w
-        g[b][a] = w
+    for tok in text.replace(",", " ").split():
+        a, _, rest = tok.partition("-")
+        b, _, w = rest.partition(":")
+        if a[:1] == "N" and a[1:].isdigit() and b[:1] == "N" and b[1:].isdigit() and w.isdigit():
+            g[a][b] = g[b][a] = int(w)
     return dict(g)
 
 def neighbors_of(graph: Dict[str, Dict[str, int]], node: str) -> Dict[str, int]:
@@ -0,0 +1,47 @@
+from __future__ import annotations
+from functools import lru_cache
+from itertools import count
+from typing import Dict, Any, List
+
+# Helpers de wire-format compartidos entre simulator.py y flooding.py:
+# direcciones "sec30.<group>.nodoX" <-> ids lógicos "NX", y headers
+# lista-de-objetos <-> dict plano.
+
+@lru_cache(maxsize=1024)
+def address_of(node: str, group: str) -> str:
+    # "N3" -> "sec30.<group>.nodo3"
+    # Los pares (node, group) se repiten todo el tiempo; cachear evita
+    # re-armar el f-string en cada publish.
+    n = int(node[1:])
+    return f"sec30.{group}.nodo{n}"
+
+@lru_cache(maxsize=1024)
+def node_of(addr: str) -> str:
+    # "sec30.<group>.nodo3" -> "N3"; si ya viene "N3", tal cual.
+    # rfind evita el split + replace + int; el cache convierte las
+    # direcciones repetidas (from/to de cada mensaje) en un hit de dict.
+    i = addr.rfind("nodo")
+    return "N" + addr[i + 4:] if i >= 0 else addr
+
+_MID = count()
+
+def new_message_id(node: str) -> str:
+    # Id para mensajes originados localmente: solo necesita ser único
+    # dentro de la corrida, así que un contador prefijado con el nodo
+    # basta — más barato y la mitad de bytes que un uuid4 en el wire.
+    return f"{node}:{next(_MID):x}"
+
+def headers_to_dict(h: Dict[str, Any] | List[Dict[str, Any]] | None) -> Dict[str, Any]:
+    # Shim de compatibilidad: nosotros emitimos headers como dict plano,
+    # pero peers con el formato viejo ([{k:v},{k2:v2}]) siguen llegando.
+    if isinstance(h, dict):
+        return h
+    d: Dict[str, Any] = {}
+    for item in (h or []):
+        d.update(item)
+    return d
+
+def dict_to_headers(d: Dict[str, Any]) -> Dict[str, Any]:
+    # El wire ya va en dict plano (ver headers_to_dict); identidad que se
+    # conserva solo por compatibilidad con callers del formato viejo.
+    return d